@@ -1,9 +1,25 @@
 import os
-from flask import Flask, render_template, request, redirect, url_for, session, flash
+import secrets
+import shutil
+import sqlite3
+import string
+from flask import Flask, render_template, request, redirect, url_for, session, flash, g
+from flask_caching import Cache
+from flask_limiter import Limiter
+from flask_limiter.util import get_remote_address
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import joinedload, load_only
 from werkzeug.utils import secure_filename
-from werkzeug.security import generate_password_hash, check_password_hash
+from werkzeug.security import check_password_hash
+from argon2 import PasswordHasher
+from argon2.exceptions import VerifyMismatchError, InvalidHashError
+import tempfile
+from jinja2 import FileSystemBytecodeCache
 from functools import wraps
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
 # --- CONFIGURATION ---
@@ -11,6 +27,17 @@ basedir = os.path.abspath(os.path.dirname(__file__))
 app = Flask(__name__)
 app.secret_key = "supersecretkey"
 
+# Server-side sessions: with a Redis URL set, the cookie carries only a
+# session id and the data lives in Redis (no per-request HMAC over the
+# whole dict). Without one we fall back to Flask's signed cookie.
+SESSION_REDIS_URL = os.environ.get('SESSION_REDIS_URL')
+if SESSION_REDIS_URL:
+    import redis
+    from flask_session import Session
+    app.config['SESSION_TYPE'] = 'redis'
+    app.config['SESSION_REDIS'] = redis.from_url(SESSION_REDIS_URL)
+    Session(app)
+
 # Database
 app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(basedir, 'attendance.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
@@ -19,14 +46,62 @@ app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 UPLOAD_FOLDER = os.path.join(basedir, 'static/uploads')
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
+app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # reject oversized upload bodies
+
+# Jinja bytecode cache: each gunicorn worker skips re-parsing templates
+# already compiled by another worker or a previous run
+JINJA_CACHE_DIR = os.path.join(tempfile.gettempdir(), 'attendance_jinja_cache')
+os.makedirs(JINJA_CACHE_DIR, exist_ok=True)
+app.jinja_env.bytecode_cache = FileSystemBytecodeCache(directory=JINJA_CACHE_DIR)
 
 db = SQLAlchemy(app)
 
+# Short-TTL cache for the read-mostly list pages; cleared on writes
+cache = Cache(app, config={'CACHE_TYPE': 'SimpleCache'})
+
+# Per-IP rate limiting for the login routes so attackers can't burn
+# KDF CPU with guessing floods
+limiter = Limiter(get_remote_address, app=app, default_limits=[])
+
+def _skip_cache():
+    # Don't cache (or serve) a page that would bake in another user's
+    # pending flash messages
+    return bool(session.get('_flashes'))
+
+# SQLite tuning: WAL lets readers run during writes and
+# synchronous=NORMAL drops the fsync per commit; applied to every
+# new connection in the pool
+@event.listens_for(Engine, "connect")
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        cursor.close()
+
+# Alphabet for unique phrases, built once instead of per call
+_ALPHA = string.ascii_letters + string.digits
+
+# Password hashing (argon2 tuned for interactive logins, ~50-100ms per hash)
+PH = PasswordHasher(time_cost=2, memory_cost=19456, parallelism=1)
+
+# Single worker thread so add_employee doesn't block on the KDF;
+# argon2-cffi releases the GIL during the native call
+_hash_executor = ThreadPoolExecutor(max_workers=1)
+
+def _hash_and_update(emp_pk, password):
+    with app.app_context():
+        emp = db.session.get(Employee, emp_pk)
+        if emp is not None:
+            emp.password_hash = PH.hash(password)
+            db.session.commit()
+
 # --- MODELS ---
 class Employee(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
-    emp_id = db.Column(db.String(20), unique=True, nullable=False)
+    emp_id = db.Column(db.String(20), unique=True, index=True, nullable=False)
     image = db.Column(db.String(200), nullable=True)
     gender = db.Column(db.String(10), nullable=True)
     address = db.Column(db.String(200), nullable=True)
@@ -36,11 +111,29 @@ class Employee(db.Model):
     password_hash = db.Column(db.String(200), nullable=False)
     unique_phrase = db.Column(db.String(100), nullable=True)  # For forgot password confirmation
 
+    # selectin: iterating several employees batches their requests into
+    # one extra query instead of one per row. attendance stays lazy --
+    # every reader queries it explicitly with a LIMIT or pagination, and
+    # eager-loading would pull the full history on each Employee fetch.
+    attendance = db.relationship('AttendanceRecord', back_populates='employee',
+                                 lazy='select', order_by='desc(AttendanceRecord.date)')
+    requests = db.relationship('EmployeeRequest', back_populates='employee',
+                               lazy='selectin', order_by='desc(EmployeeRequest.timestamp)')
+
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = PH.hash(password)
 
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        if not self.password_hash:
+            # Hash still being computed in the background
+            return False
+        try:
+            return PH.verify(self.password_hash, password)
+        except VerifyMismatchError:
+            return False
+        except InvalidHashError:
+            # Old werkzeug PBKDF2 hashes from before the argon2 switch
+            return check_password_hash(self.password_hash, password)
 
     def __repr__(self):
         return f'<Employee {self.name}>'
@@ -50,10 +143,15 @@ class AttendanceRecord(db.Model):
     employee_id = db.Column(db.Integer, db.ForeignKey('employee.id'), nullable=False)
     date = db.Column(db.Date, nullable=False)
     status = db.Column(db.String(10), nullable=False)
-    check_in = db.Column(db.String(20), nullable=True)
-    check_out = db.Column(db.String(20), nullable=True)
+    check_in = db.Column(db.Time, nullable=True)
+    check_out = db.Column(db.Time, nullable=True)
 
-    employee = db.relationship('Employee', backref=db.backref('attendance', lazy=True))
+    employee = db.relationship('Employee', back_populates='attendance')
+
+    # Dashboard filters by employee and orders by date; unique so an
+    # employee can only have one record per day and check-in can use
+    # INSERT ... ON CONFLICT
+    __table_args__ = (db.Index('ix_att_emp_date', 'employee_id', 'date', unique=True),)
 
     def __repr__(self):
         return f'<Attendance {self.employee_id} on {self.date}>'
@@ -64,16 +162,22 @@ class Admin(db.Model):
     password_hash = db.Column(db.String(200), nullable=False)
 
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = PH.hash(password)
 
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        try:
+            return PH.verify(self.password_hash, password)
+        except VerifyMismatchError:
+            return False
+        except InvalidHashError:
+            # Old werkzeug PBKDF2 hashes from before the argon2 switch
+            return check_password_hash(self.password_hash, password)
 
 class Notification(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     message = db.Column(db.String(500), nullable=False)
-    employee_id = db.Column(db.Integer, db.ForeignKey('employee.id'), nullable=True)  # Null means all employees
-    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+    employee_id = db.Column(db.Integer, db.ForeignKey('employee.id'), index=True, nullable=True)  # Null means all employees
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow, index=True)
 
 class EmployeeRequest(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -83,8 +187,17 @@ class EmployeeRequest(db.Model):
     status = db.Column(db.String(20), default="Pending")
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
 
-    # Add this line:
-    employee = db.relationship('Employee', backref=db.backref('requests', lazy=True))
+    employee = db.relationship('Employee', back_populates='requests')
+
+    __table_args__ = (db.Index('ix_req_emp_timestamp', 'employee_id', 'timestamp'),)
+
+# --- REQUEST SETUP ---
+@app.before_request
+def load_current_employee():
+    # One Employee fetch per authenticated request; routes read
+    # g.current_emp instead of re-querying
+    if session.get('employee_logged_in'):
+        g.current_emp = db.session.get(Employee, session['employee_id'])
 
 # --- DECORATORS ---
 def admin_required(f):
@@ -102,22 +215,35 @@ def employee_required(f):
         if not session.get('employee_logged_in'):
             flash('You must be logged in as employee', 'warning')
             return redirect(url_for('employee_login'))
+        if getattr(g, 'current_emp', None) is None:
+            # Session points at an employee that no longer exists
+            session.pop('employee_logged_in', None)
+            session.pop('employee_id', None)
+            flash('You must be logged in as employee', 'warning')
+            return redirect(url_for('employee_login'))
         return f(*args, **kwargs)
     return decorated_function
 
 # --- ROUTES ---
 @app.route('/')
+@cache.cached(timeout=30, query_string=True, unless=_skip_cache)
 def index():
-    employees = Employee.query.all()
+    # Only the columns the cards show, 50 employees per page
+    page = request.args.get('page', 1, type=int)
+    employees = Employee.query.options(
+        load_only(Employee.name, Employee.emp_id, Employee.image)
+    ).paginate(page=page, per_page=50, error_out=False)
     return render_template('index.html', employees=employees)
 
 # --- ADMIN LOGIN ---
 @app.route('/admin/login', methods=['GET', 'POST'])
+@limiter.limit("5 per minute", methods=['POST'])
 def admin_login():
     if request.method == 'POST':
         username = request.form['username']
         password = request.form['password']
-        admin = Admin.query.filter_by(username=username).first()
+        # Only the hash comes off disk; no need for the full row to verify
+        admin = Admin.query.options(load_only(Admin.password_hash)).filter_by(username=username).first()
         if admin and admin.check_password(password):
             session['admin_logged_in'] = True
             return redirect(url_for('admin_employees'))
@@ -134,8 +260,14 @@ def admin_logout():
 # --- ADMIN DASHBOARD ---
 @app.route('/admin/employees')
 @admin_required
+@cache.cached(timeout=30, query_string=True, unless=_skip_cache)
 def admin_employees():
-    employees = Employee.query.all()
+    # Leave out password_hash/unique_phrase and paginate the table
+    page = request.args.get('page', 1, type=int)
+    employees = Employee.query.options(
+        load_only(Employee.name, Employee.emp_id, Employee.gender, Employee.address,
+                  Employee.mobile_number, Employee.date_of_birth, Employee.email, Employee.image)
+    ).paginate(page=page, per_page=50, error_out=False)
     return render_template('admin_employees.html', employees=employees)
 
 # --- ADD EMPLOYEE ---
@@ -167,7 +299,9 @@ def add_employee():
         if image_file and image_file.filename != "":
             filename = secure_filename(image_file.filename)
             image_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-            image_file.save(image_path)
+            # Stream to disk in 1MB chunks instead of buffering the whole file
+            with open(image_path, 'wb') as f:
+                shutil.copyfileobj(image_file.stream, f, 1 << 20)
 
         # Validate numeric fields
         if not emp_id_str.isdigit():
@@ -177,9 +311,9 @@ def add_employee():
             flash("Mobile Number must be numeric", "danger")
             return redirect(url_for('add_employee'))
 
-        # Generate unique phrase
-        import random, string
-        unique_phrase = ''.join(random.choices(string.ascii_letters + string.digits, k=8))
+        # Generate unique phrase (used for password recovery, so use the
+        # OS CSPRNG rather than the random module)
+        unique_phrase = ''.join(secrets.choice(_ALPHA) for _ in range(8))
 
         # Create employee
         new_emp = Employee(
@@ -191,11 +325,14 @@ def add_employee():
             date_of_birth=date_of_birth,
             email=email,
             image=filename,
-            unique_phrase=unique_phrase
+            unique_phrase=unique_phrase,
+            password_hash=""  # placeholder until the worker writes the real hash
         )
-        new_emp.set_password(password)
         db.session.add(new_emp)
         db.session.commit()
+        cache.clear()
+        # Hash off the request path; the admin's response doesn't wait on the KDF
+        _hash_executor.submit(_hash_and_update, new_emp.id, password)
 
         flash(f"Employee added! Unique Phrase: {unique_phrase}", "success")
         return redirect(url_for('admin_employees'))
@@ -223,7 +360,9 @@ def edit_employee(emp_id):
         if image_file and image_file.filename != "":
             filename = secure_filename(image_file.filename)
             image_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-            image_file.save(image_path)
+            # Stream to disk in 1MB chunks instead of buffering the whole file
+            with open(image_path, 'wb') as f:
+                shutil.copyfileobj(image_file.stream, f, 1 << 20)
             emp.image = filename
 
         # Optional: update unique phrase
@@ -232,6 +371,7 @@ def edit_employee(emp_id):
             emp.unique_phrase = unique_phrase
 
         db.session.commit()
+        cache.clear()
         flash("Employee updated successfully!", "success")
         return redirect(url_for('admin_employees'))
 
@@ -244,16 +384,19 @@ def delete_employee(emp_id):
     emp = Employee.query.get_or_404(emp_id)
     db.session.delete(emp)
     db.session.commit()
+    cache.clear()
     flash("Employee deleted successfully!", "success")
     return redirect(url_for('admin_employees'))
 
 # --- EMPLOYEE LOGIN ---
 @app.route('/employee/login', methods=['GET', 'POST'])
+@limiter.limit("5 per minute", methods=['POST'])
 def employee_login():
     if request.method == 'POST':
         emp_id = request.form['emp_id']
         password = request.form['password']
-        emp = Employee.query.filter_by(emp_id=emp_id).first()
+        # Only the hash comes off disk; no need for the full row to verify
+        emp = Employee.query.options(load_only(Employee.password_hash)).filter_by(emp_id=emp_id).first()
         if emp and emp.check_password(password):
             session['employee_logged_in'] = True
             session['employee_id'] = emp.id
@@ -280,6 +423,7 @@ def update_employee_request_status(request_id, new_status):
 
     req.status = new_status
     db.session.commit()
+    cache.clear()
     flash(f'Request {new_status.lower()} successfully!', 'success')
     return redirect(url_for('admin_employee_requests'))
 
@@ -287,43 +431,67 @@ def update_employee_request_status(request_id, new_status):
 @app.route('/employee/dashboard', methods=['GET', 'POST'])
 @employee_required
 def employee_dashboard():
-    emp_id = session.get('employee_id')
-    emp = Employee.query.get_or_404(emp_id)
-    attendance = AttendanceRecord.query.filter_by(employee_id=emp.id).order_by(AttendanceRecord.date.desc()).all()
-    notifications = Notification.query.filter((Notification.employee_id==emp.id)|(Notification.employee_id==None)).order_by(Notification.timestamp.desc()).all()
-    requests = EmployeeRequest.query.filter_by(employee_id=emp.id).order_by(EmployeeRequest.timestamp.desc()).all()
+    emp = g.current_emp
 
-    # Check-in/out handling
+    # Check-in/out handling: one SQL statement per action instead of
+    # SELECT + INSERT/UPDATE, then redirect so the page re-renders fresh
     if request.method == 'POST':
         action = request.form.get('action')
         today = datetime.today().date()
-        record = AttendanceRecord.query.filter_by(employee_id=emp.id, date=today).first()
 
         if action == "check_in":
-            if not record:
-                new_record = AttendanceRecord(employee_id=emp.id, date=today, status="Present", check_in=datetime.now().strftime("%H:%M:%S"))
-                db.session.add(new_record)
-                db.session.commit()
+            result = db.session.execute(
+                sqlite_insert(AttendanceRecord).values(
+                    employee_id=emp.id, date=today, status="Present",
+                    check_in=datetime.now().time().replace(microsecond=0)
+                ).on_conflict_do_nothing(index_elements=['employee_id', 'date'])
+            )
+            db.session.commit()
+            if result.rowcount:
                 flash("Checked in successfully!", "success")
             else:
                 flash("Already checked in today!", "warning")
 
         elif action == "check_out":
-            if record and not record.check_out:
-                record.check_out = datetime.now().strftime("%H:%M:%S")
-                db.session.commit()
+            result = db.session.execute(
+                db.update(AttendanceRecord)
+                .where(AttendanceRecord.employee_id == emp.id,
+                       AttendanceRecord.date == today,
+                       AttendanceRecord.check_out.is_(None))
+                .values(check_out=datetime.now().time().replace(microsecond=0))
+            )
+            db.session.commit()
+            if result.rowcount:
                 flash("Checked out successfully!", "success")
             else:
                 flash("Cannot check out before checking in!", "danger")
 
+        return redirect(url_for('employee_dashboard'))
+
+    # The requests collection is lazy='selectin' so it came back with
+    # the employee fetch. Notifications stay a separate query because
+    # of the all-employees (NULL) filter.
+    # Only the 30 most recent days; the full history has its own paginated page
+    attendance = AttendanceRecord.query.filter_by(employee_id=emp.id).order_by(AttendanceRecord.date.desc()).limit(30).all()
+    notifications = Notification.query.filter((Notification.employee_id==emp.id)|(Notification.employee_id==None)).order_by(Notification.timestamp.desc()).all()
+    requests = emp.requests
+
     return render_template('employee_dashboard.html', emp=emp, attendance=attendance, notifications=notifications, requests=requests)
 
+# --- EMPLOYEE ATTENDANCE HISTORY ---
+@app.route('/employee/attendance')
+@employee_required
+def employee_attendance():
+    emp = g.current_emp
+    page = request.args.get('page', 1, type=int)
+    attendance = AttendanceRecord.query.filter_by(employee_id=emp.id).order_by(AttendanceRecord.date.desc()).paginate(page=page, per_page=50, error_out=False)
+    return render_template('employee_attendance.html', emp=emp, attendance=attendance)
+
 # --- CREATE EMPLOYEE REQUEST ---
 @app.route('/employee/create_request', methods=['GET', 'POST'])
 @employee_required
 def employee_create_request():
-    emp_id = session.get('employee_id')
-    emp = Employee.query.get_or_404(emp_id)
+    emp = g.current_emp
 
     if request.method == 'POST':
         request_type = request.form.get('request_type')
@@ -340,6 +508,7 @@ def employee_create_request():
         )
         db.session.add(new_request)
         db.session.commit()
+        cache.clear()
         flash("Request submitted successfully!", "success")
         return redirect(url_for('employee_dashboard'))
 
@@ -349,8 +518,7 @@ def employee_create_request():
 @app.route('/employee/edit_profile', methods=['GET', 'POST'])
 @employee_required
 def edit_employee_profile():
-    emp_id = session.get('employee_id')
-    emp = Employee.query.get_or_404(emp_id)
+    emp = g.current_emp
 
     if request.method == 'POST':
         emp.name = request.form['name']
@@ -368,7 +536,9 @@ def edit_employee_profile():
         if image_file and image_file.filename != "":
             filename = secure_filename(image_file.filename)
             image_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-            image_file.save(image_path)
+            # Stream to disk in 1MB chunks instead of buffering the whole file
+            with open(image_path, 'wb') as f:
+                shutil.copyfileobj(image_file.stream, f, 1 << 20)
             emp.image = filename
 
         db.session.commit()
@@ -395,8 +565,7 @@ def employee_forgot_password():
 @app.route('/employee/request', methods=['GET', 'POST'])
 @employee_required
 def employee_request():
-    emp_id = session.get('employee_id')
-    emp = Employee.query.get_or_404(emp_id)
+    emp = g.current_emp
 
     if request.method == 'POST':
         request_type = request.form['request_type']
@@ -404,6 +573,7 @@ def employee_request():
         new_request = EmployeeRequest(employee_id=emp.id, request_type=request_type, message=message)
         db.session.add(new_request)
         db.session.commit()
+        cache.clear()
         flash("Request submitted successfully!", "success")
         return redirect(url_for('employee_dashboard'))
 
@@ -447,9 +617,11 @@ def admin_notifications():
 # --- ADMIN VIEW EMPLOYEE REQUESTS ---
 @app.route('/admin/employee_requests')
 @admin_required
+@cache.cached(timeout=30, query_string=True, unless=_skip_cache)
 def admin_employee_requests():
-    # Only requests that have a valid employee
-    requests = EmployeeRequest.query.join(Employee).order_by(EmployeeRequest.timestamp.desc()).all()
+    # Only requests that have a valid employee; joinedload so the template's
+    # req.employee access doesn't fire one query per row
+    requests = EmployeeRequest.query.join(Employee).options(joinedload(EmployeeRequest.employee)).order_by(EmployeeRequest.timestamp.desc()).all()
     return render_template('admin_employee_requests.html', requests=requests)
 
 
@@ -475,22 +647,27 @@ def test_hub():
 
 # --- DASHBOARD STATS AND PERFORMANCE (Optional) ---
 def calculate_rating(emp_id):
-    attendance = AttendanceRecord.query.filter_by(employee_id=emp_id).all()
-    total_days = len(attendance)
-    present_days = sum(1 for a in attendance if a.status == "Present")
+    # Aggregate in SQL so the DB returns two integers instead of
+    # hydrating every AttendanceRecord into Python
+    total_days, present_days = db.session.query(
+        db.func.count(AttendanceRecord.id),
+        db.func.sum(db.case((AttendanceRecord.status == "Present", 1), else_=0))
+    ).filter_by(employee_id=emp_id).one()
     if total_days == 0:
         return 0
     return round((present_days / total_days) * 10, 2)
 
-@app.context_processor
-def inject_ratings():
+@app.before_request
+def load_employee_rating():
+    # Computed once per request; the context processor runs for every
+    # template (including nested ones) and would re-query each time
     if 'employee_id' in session:
-        emp_id = session['employee_id']
-        return {'employee_rating': calculate_rating(emp_id)}
-    return {}
+        g.employee_rating = calculate_rating(session['employee_id'])
 
+@app.context_processor
+def inject_ratings():
+    return {'employee_rating': getattr(g, 'employee_rating', 0)}
 
-from werkzeug.security import generate_password_hash
 
 @app.cli.command("create-admin")
 def create_admin():
@@ -498,9 +675,6 @@ def create_admin():
     username = input("Enter new admin username: ")
     password = input("Enter new admin password: ")
 
-    # Hash the password
-    hashed_pw = generate_password_hash(password)
-
     # Check if admin already exists
     existing = Admin.query.filter_by(username=username).first()
     if existing:
@@ -508,7 +682,8 @@ def create_admin():
         return
 
     # Create new admin
-    new_admin = Admin(username=username, password_hash=hashed_pw)
+    new_admin = Admin(username=username)
+    new_admin.set_password(password)
     db.session.add(new_admin)
     db.session.commit()
 
@@ -2,4 +2,9 @@ from app import app, db  # replace with actual file names
 
 with app.app_context():
     db.create_all()
-    print("Database created successfully!")
\ No newline at end of file
+    # create_all skips tables that already exist, so build any new
+    # indexes on databases created before they were added
+    for table in db.metadata.tables.values():
+        for index in table.indexes:
+            index.create(bind=db.engine, checkfirst=True)
+    print("Database created successfully!")
@@ -0,0 +1,6 @@
+# Threaded workers so concurrent logins overlap their argon2 hashing:
+# argon2-cffi releases the GIL during the native call, so with sync
+# workers each login would block a whole worker for the full KDF time.
+workers = 2
+worker_class = "gthread"
+threads = 8